@@ -1,21 +1,102 @@
 import json
 import boto3
+from botocore.config import Config
 import logging
 import re
+from types import MappingProxyType
 from typing import Dict, Any
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize SageMaker client
-sagemaker_runtime = boto3.client('sagemaker-runtime', region_name='us-west-2')
+# Initialize SageMaker client once per container so warm invocations reuse
+# its connection pool; adaptive retries back off on endpoint throttling
+sagemaker_runtime = boto3.client(
+    'sagemaker-runtime',
+    region_name='us-west-2',
+    config=Config(
+        retries={'mode': 'adaptive', 'max_attempts': 3},
+        tcp_keepalive=True,
+        max_pool_connections=10
+    )
+)
 
 # Constants
 ENDPOINT_NAME = 'phi2-v5-inference'
 MAX_TOKENS = 256
 TIMEOUT = 30  # seconds
 
+# Phrase tables for parse_compliance_response, built once per container
+# rather than on every invocation; read-only so warm invocations can't
+# mutate state shared with later ones
+
+# Positive indicators of geo-compliance requirements
+POSITIVE_INDICATORS = (
+    'requires geo', 'needs geo', 'geo-specific', 'geo-based',
+    'gdpr compliance', 'ccpa compliance', 'eu compliance',
+    'california compliance', 'jurisdiction-specific',
+    'location-based', 'region-specific'
+)
+
+# Negative indicators that explicitly say no geo-compliance is needed
+NEGATIVE_INDICATORS = (
+    'does not require geo', 'does not need geo', 'no geo-specific',
+    'no geo-based', 'standard implementation', 'no jurisdiction-specific',
+    'not location-based', 'not region-specific', 'no specific regulations',
+    'no specific laws', 'no regulations', 'no laws'
+)
+
+JURISDICTION_PATTERNS = MappingProxyType({
+    'EU': ('eu', 'europe', 'gdpr', 'european'),
+    'US-CA': ('california', 'ccpa', 'ca'),
+    'US': ('united states', 'us federal', 'coppa', 'sox'),
+    'UK': ('uk', 'united kingdom', 'british'),
+    'Canada': ('canada', 'canadian', 'pipeda'),
+    'Brazil': ('brazil', 'brazilian', 'lgpd')
+})
+
+# (compiled pattern, citation format, jurisdiction)
+LEGAL_PATTERNS = tuple(
+    (re.compile(pattern, re.IGNORECASE), format_str, jurisdiction)
+    for pattern, format_str, jurisdiction in (
+        (r'gdpr\s+article\s+(\d+)', 'GDPR Article {}', 'EU'),
+        (r'ccpa\s+section\s+(\d+)', 'CCPA Section {}', 'US-CA'),
+        (r'coppa', 'COPPA', 'US'),
+        (r'sox\s+section\s+(\d+)', 'SOX Section {}', 'US'),
+        (r'lgpd\s+article\s+(\d+)', 'LGPD Article {}', 'Brazil'),
+        (r'pipeda\s+principle\s+(\d+)', 'PIPEDA Principle {}', 'Canada')
+    )
+)
+
+DATA_PATTERNS = MappingProxyType({
+    'personal data': ('personal data', 'personal information'),
+    'cookies': ('cookies', 'cookie'),
+    'analytics': ('analytics', 'tracking'),
+    'financial data': ('financial', 'transaction'),
+    'age data': ('age', 'birth date', 'date of birth')
+})
+
+BASIS_PATTERNS = MappingProxyType({
+    'consent': ('consent', 'permission'),
+    'legitimate interest': ('legitimate interest', 'business purpose'),
+    'legal obligation': ('legal obligation', 'required by law'),
+    'contract': ('contract', 'agreement')
+})
+
+CONSENT_PHRASES = ('consent', 'permission', 'opt-in', 'agree')
+
+def phrase_matcher(phrases):
+    """Compile phrases into one alternation so a text is scanned once per table"""
+    return re.compile('|'.join(re.escape(phrase) for phrase in phrases))
+
+POSITIVE_MATCHER = phrase_matcher(POSITIVE_INDICATORS)
+NEGATIVE_MATCHER = phrase_matcher(NEGATIVE_INDICATORS)
+CONSENT_MATCHER = phrase_matcher(CONSENT_PHRASES)
+JURISDICTION_MATCHERS = MappingProxyType({name: phrase_matcher(p) for name, p in JURISDICTION_PATTERNS.items()})
+DATA_MATCHERS = MappingProxyType({name: phrase_matcher(p) for name, p in DATA_PATTERNS.items()})
+BASIS_MATCHERS = MappingProxyType({name: phrase_matcher(p) for name, p in BASIS_PATTERNS.items()})
+
 def parse_compliance_response(text: str) -> Dict[str, Any]:
     """
     Parse the model's text response to extract structured compliance data
@@ -32,30 +113,18 @@ def parse_compliance_response(text: str) -> Dict[str, Any]:
         'description': text  # Store the full description
     }
     
+    # Nothing to scan in an empty answer; the defaults are already the result
+    if not text.strip():
+        return compliance_data
+    
     text_lower = text.lower()
     
     # Check if geo-specific logic is needed - be more specific
-    # Look for positive indicators of geo-compliance requirements
-    positive_indicators = [
-        'requires geo', 'needs geo', 'geo-specific', 'geo-based',
-        'gdpr compliance', 'ccpa compliance', 'eu compliance',
-        'california compliance', 'jurisdiction-specific',
-        'location-based', 'region-specific'
-    ]
-    
-    # Look for negative indicators that explicitly say no geo-compliance is needed
-    negative_indicators = [
-        'does not require geo', 'does not need geo', 'no geo-specific',
-        'no geo-based', 'standard implementation', 'no jurisdiction-specific',
-        'not location-based', 'not region-specific', 'no specific regulations',
-        'no specific laws', 'no regulations', 'no laws'
-    ]
-    
     # Check for negative indicators first
-    has_negative = any(phrase in text_lower for phrase in negative_indicators)
+    has_negative = NEGATIVE_MATCHER.search(text_lower) is not None
     
     # Check for positive indicators
-    has_positive = any(phrase in text_lower for phrase in positive_indicators)
+    has_positive = POSITIVE_MATCHER.search(text_lower) is not None
     
     # Set geo-compliance requirement based on indicators
     if has_positive and not has_negative:
@@ -68,32 +137,14 @@ def parse_compliance_response(text: str) -> Dict[str, Any]:
         compliance_data['need_geo_logic'] = jurisdiction_mentions > 0
     
     # Extract jurisdictions
-    jurisdiction_patterns = {
-        'EU': ['eu', 'europe', 'gdpr', 'european'],
-        'US-CA': ['california', 'ccpa', 'ca'],
-        'US': ['united states', 'us federal', 'coppa', 'sox'],
-        'UK': ['uk', 'united kingdom', 'british'],
-        'Canada': ['canada', 'canadian', 'pipeda'],
-        'Brazil': ['brazil', 'brazilian', 'lgpd']
-    }
-    
-    for jurisdiction, patterns in jurisdiction_patterns.items():
-        if any(pattern in text_lower for pattern in patterns):
+    for jurisdiction, matcher in JURISDICTION_MATCHERS.items():
+        if matcher.search(text_lower):
             if jurisdiction not in compliance_data['jurisdictions']:
                 compliance_data['jurisdictions'].append(jurisdiction)
     
     # Enhanced legal citations extraction
-    legal_patterns = [
-        (r'gdpr\s+article\s+(\d+)', 'GDPR Article {}', 'EU'),
-        (r'ccpa\s+section\s+(\d+)', 'CCPA Section {}', 'US-CA'),
-        (r'coppa', 'COPPA', 'US'),
-        (r'sox\s+section\s+(\d+)', 'SOX Section {}', 'US'),
-        (r'lgpd\s+article\s+(\d+)', 'LGPD Article {}', 'Brazil'),
-        (r'pipeda\s+principle\s+(\d+)', 'PIPEDA Principle {}', 'Canada')
-    ]
-    
-    for pattern, format_str, jurisdiction in legal_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
+    for pattern, format_str, jurisdiction in LEGAL_PATTERNS:
+        matches = pattern.findall(text)
         for match in matches:
             if isinstance(match, tuple):
                 article_num = match[0]
@@ -121,34 +172,19 @@ def parse_compliance_response(text: str) -> Dict[str, Any]:
         })
     
     # Extract data categories
-    data_patterns = {
-        'personal data': ['personal data', 'personal information'],
-        'cookies': ['cookies', 'cookie'],
-        'analytics': ['analytics', 'tracking'],
-        'financial data': ['financial', 'transaction'],
-        'age data': ['age', 'birth date', 'date of birth']
-    }
-    
-    for category, patterns in data_patterns.items():
-        if any(pattern in text_lower for pattern in patterns):
+    for category, matcher in DATA_MATCHERS.items():
+        if matcher.search(text_lower):
             if category not in compliance_data['data_categories']:
                 compliance_data['data_categories'].append(category)
     
     # Extract lawful basis
-    basis_patterns = {
-        'consent': ['consent', 'permission'],
-        'legitimate interest': ['legitimate interest', 'business purpose'],
-        'legal obligation': ['legal obligation', 'required by law'],
-        'contract': ['contract', 'agreement']
-    }
-    
-    for basis, patterns in basis_patterns.items():
-        if any(pattern in text_lower for pattern in patterns):
+    for basis, matcher in BASIS_MATCHERS.items():
+        if matcher.search(text_lower):
             if basis not in compliance_data['lawful_basis']:
                 compliance_data['lawful_basis'].append(basis)
     
     # Check if consent is required
-    if any(phrase in text_lower for phrase in ['consent', 'permission', 'opt-in', 'agree']):
+    if CONSENT_MATCHER.search(text_lower):
         compliance_data['consent_required'] = True
     
     # Calculate confidence based on response quality
@@ -230,7 +266,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         
         # Log the request (without sensitive data)
-        logger.info(f"Processing request - Instruction length: {len(instruction)}, Input length: {len(feature_input)}")
+        logger.info("Processing request - Instruction length: %d, Input length: %d", len(instruction), len(feature_input))
         
         # Prepare payload for SageMaker
         sagemaker_payload = {
@@ -239,7 +275,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
         
         # Invoke SageMaker endpoint
-        logger.info(f"Invoking SageMaker endpoint: {ENDPOINT_NAME}")
+        logger.info("Invoking SageMaker endpoint: %s", ENDPOINT_NAME)
         
         response = sagemaker_runtime.invoke_endpoint(
             EndpointName=ENDPOINT_NAME,
@@ -248,13 +284,13 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         )
         
         # Parse SageMaker response
-        result = json.loads(response['Body'].read().decode())
+        result = json.loads(response['Body'].read())  # json decodes UTF-8 bytes itself
         
         # Extract generated text
         generated_text = result.get('generated_text', '')
         
         # Log response info
-        logger.info(f"SageMaker response received - Generated text length: {len(generated_text)}")
+        logger.info("SageMaker response received - Generated text length: %d", len(generated_text))
         
         # Parse compliance data from the response
         compliance_data = parse_compliance_response(generated_text)
@@ -286,7 +322,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
     except Exception as e:
         # Log the error
-        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        logger.error("Error processing request: %s", e, exc_info=True)
         
         # Return error response
         error_response = {
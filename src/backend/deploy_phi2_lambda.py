@@ -4,6 +4,7 @@ Deploy Phi-2 v5 Lambda function with Function URL for easy testing
 """
 
 import boto3
+import io
 import json
 import time
 import zipfile
@@ -15,6 +16,9 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 
+# Lambda source and IAM policy documents committed alongside the repo
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Lamda functions')
+
 class Phi2LambdaDeployer:
     def __init__(self, profile_name='bedrock-561', region='us-west-2'):
         self.session = boto3.Session(profile_name=profile_name, region_name=region)
@@ -51,7 +55,7 @@ class Phi2LambdaDeployer:
                 pass
             
             # Read trust policy
-            with open('/Users/hema/Desktop/bedrock/phi2_lambda_trust_policy.json', 'r') as f:
+            with open(os.path.join(LAMBDA_DIR, 'phi2_lambda_trust_policy.json'), 'r') as f:
                 trust_policy = f.read()
             
             # Create role
@@ -65,7 +69,7 @@ class Phi2LambdaDeployer:
             logger.info(f"✅ Created IAM role: {role_arn}")
             
             # Read permissions policy
-            with open('/Users/hema/Desktop/bedrock/phi2_lambda_role_policy.json', 'r') as f:
+            with open(os.path.join(LAMBDA_DIR, 'phi2_lambda_role_policy.json'), 'r') as f:
                 permissions_policy = f.read()
             
             # Attach permissions policy
@@ -98,19 +102,14 @@ class Phi2LambdaDeployer:
         logger.info("📦 Creating Lambda deployment package...")
         
         try:
-            # Create temporary zip file
-            zip_path = '/tmp/phi2_lambda.zip'
+            # Build the zip in memory; there's no need to round-trip via /tmp
+            buffer = io.BytesIO()
             
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
                 # Add Lambda function code
-                zipf.write('/Users/hema/Desktop/bedrock/Lamda functions/phi2_lambda_function.py', 'lambda_function.py')
-            
-            # Read zip file content
-            with open(zip_path, 'rb') as f:
-                zip_content = f.read()
+                zipf.write(os.path.join(LAMBDA_DIR, 'phi2_lambda_function.py'), 'lambda_function.py')
             
-            # Cleanup
-            os.remove(zip_path)
+            zip_content = buffer.getvalue()
             
             logger.info("✅ Lambda package created successfully")
             return zip_content
@@ -244,7 +243,7 @@ Law Context (structured JSON):
             )
             
             # Parse response
-            response_payload = json.loads(response['Payload'].read().decode())
+            response_payload = json.loads(response['Payload'].read())
             
             if response_payload.get('statusCode') == 200:
                 logger.info("✅ Lambda function test successful!")
@@ -262,8 +261,7 @@ Law Context (structured JSON):
 
     def deploy_full_pipeline(self):
         """Deploy complete Lambda pipeline"""
-        logger.info("🚀 Starting Phi-2 v5 Lambda deployment...")
-        logger.info("=" * 70)
+        logger.info("🚀 Starting Phi-2 v5 Lambda deployment...\n%s", "=" * 70)
         
         # Step 1: Create IAM role
         role_arn = self.create_iam_role()
@@ -306,9 +304,7 @@ def main():
     """Main function"""
     deployer = Phi2LambdaDeployer()
     
-    logger.info("🎯 Phi-2 v5 Lambda Function Deployment")
-    logger.info("Creates Function URL for easy web access to SageMaker endpoint")
-    logger.info("=" * 70)
+    logger.info("🎯 Phi-2 v5 Lambda Function Deployment\nCreates Function URL for easy web access to SageMaker endpoint\n%s", "=" * 70)
     
     result = deployer.deploy_full_pipeline()
     
@@ -5,7 +5,9 @@ Deploy the newly trained Phi-2 v5 model as a fresh endpoint
 
 import boto3
 import json
+import sys
 import time
+from botocore.config import Config
 from datetime import datetime
 import logging
 
@@ -13,10 +15,17 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 
+# Shared by every client so endpoint polling reuses one kept-alive connection
+BOTO_CONFIG = Config(
+    retries={'mode': 'adaptive', 'max_attempts': 10},
+    tcp_keepalive=True,
+    max_pool_connections=32
+)
+
 class Phi2V5Deployer:
     def __init__(self, profile_name='bedrock-561', region='us-west-2'):
         self.session = boto3.Session(profile_name=profile_name, region_name=region)
-        self.sagemaker = self.session.client('sagemaker')
+        self.sagemaker = self.session.client('sagemaker', config=BOTO_CONFIG)
         self.region = region
         
         # Configuration
@@ -48,7 +57,6 @@ class Phi2V5Deployer:
                         'HF_TASK': 'text-generation',  # CRITICAL: Required by HF inference toolkit
                         'BASE_MODEL_ID': self.config['base_model'],
                         'HF_HOME': '/tmp/hf_home',
-                        'TRANSFORMERS_CACHE': '/tmp/transformers_cache',
                         'MODEL_ARTIFACT_S3': self.config['model_artifacts']
                     }
                 },
@@ -110,12 +118,27 @@ class Phi2V5Deployer:
         """Wait for endpoint to be InService"""
         logger.info(f"⏳ Waiting for endpoint {endpoint_name} to be ready...")
         
+        start_time = time.time()
+        prev_status = None
+        heartbeat_shown = False
+        
         while True:
             try:
                 response = self.sagemaker.describe_endpoint(EndpointName=endpoint_name)
                 status = response['EndpointStatus']
                 
-                logger.info(f"📊 Endpoint status: {status}")
+                # Log only status transitions; in between, rewrite a single
+                # heartbeat line on interactive terminals
+                if status != prev_status:
+                    if heartbeat_shown:
+                        sys.stdout.write("\n")
+                        heartbeat_shown = False
+                    logger.info(f"📊 Endpoint status: {status}")
+                    prev_status = status
+                elif sys.stdout.isatty():
+                    sys.stdout.write(f"\r⏳ [elapsed={time.time() - start_time:.0f}s] status={status}")
+                    sys.stdout.flush()
+                    heartbeat_shown = True
                 
                 if status == 'InService':
                     logger.info("✅ Endpoint is ready!")
@@ -132,8 +155,7 @@ class Phi2V5Deployer:
 
     def deploy_full_pipeline(self):
         """Deploy complete pipeline"""
-        logger.info("🚀 Starting Phi-2 v5 deployment...")
-        logger.info("=" * 60)
+        logger.info("🚀 Starting Phi-2 v5 deployment...\n%s", "=" * 60)
         
         # Step 1: Create model
         model_name = self.create_model()
@@ -165,9 +187,7 @@ def main():
     """Main function"""
     deployer = Phi2V5Deployer()
     
-    logger.info("🎯 Phi-2 v5 Model Deployment")
-    logger.info("Trained on 1441 examples with improved LoRA configuration")
-    logger.info("=" * 60)
+    logger.info("🎯 Phi-2 v5 Model Deployment\nTrained on 1441 examples with improved LoRA configuration\n%s", "=" * 60)
     
     success = deployer.deploy_full_pipeline()
     
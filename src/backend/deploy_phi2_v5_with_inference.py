@@ -5,9 +5,15 @@ Deploy Phi-2 v5 model with custom inference script for proper LoRA handling
 
 import boto3
 import json
+import sys
 import time
 import tarfile
 import os
+import shutil
+import hashlib
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from datetime import datetime
 import logging
 
@@ -15,11 +21,37 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 
+# Shared by every client so endpoint polling reuses one kept-alive connection
+BOTO_CONFIG = Config(
+    retries={'mode': 'adaptive', 'max_attempts': 10},
+    tcp_keepalive=True,
+    max_pool_connections=32
+)
+
+# Multipart, multi-threaded S3 transfers for the multi-GB model package
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=16,
+    use_threads=True
+)
+
+# Static files shipped in the model package's code/ directory
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.join(BACKEND_DIR, 'code')
+INFERENCE_SCRIPT = os.path.join(BACKEND_DIR, 'inference_v5.py')
+
+# Extracted training artifacts, keyed by the source tarball's S3 ETag
+MODEL_CACHE_DIR = os.path.expanduser('~/.cache/phi2-v5-model')
+
+# Same base as ./Dockerfile, so both deploy paths get StaticCache and the compiled decode path
+DLC_IMAGE = '763104351884.dkr.ecr.us-west-2.amazonaws.com/huggingface-pytorch-inference:2.6.0-transformers4.49.0-gpu-py312-cu124-ubuntu22.04'
+
 class Phi2V5InferenceDeployer:
     def __init__(self, profile_name='bedrock-561', region='us-west-2'):
         self.session = boto3.Session(profile_name=profile_name, region_name=region)
-        self.sagemaker = self.session.client('sagemaker')
-        self.s3 = self.session.client('s3')
+        self.sagemaker = self.session.client('sagemaker', config=BOTO_CONFIG)
+        self.s3 = self.session.client('s3', config=BOTO_CONFIG)
         self.region = region
         
         # Configuration
@@ -28,72 +60,108 @@ class Phi2V5InferenceDeployer:
             "bucket": "sagemaker-us-west-2-561947681110",
             "base_model": "microsoft/phi-2",
             "endpoint_instance": "ml.g5.4xlarge",  # Your working instance type
+            "quantization": "none",  # none / int8 / nf4, read by inference.py as QUANTIZATION
+            "quantized_instance": "ml.g4dn.xlarge",  # Quantized Phi-2 (<3GB of weights) fits a 16GB T4
+            "cuda_memory_fraction": "0.9",  # Share of GPU memory, split evenly between the workers
+            "model_server_workers": 2,  # Phi-2 fp16 (~5.5GB) fits twice on the 24GB A10G
+            "quantized_model_server_workers": 1,  # The 16GB-RAM T4 host loads and compiles one copy
+            "startup_health_check_timeout": 1800,  # Seconds; each worker loads, compiles and warms up in turn
+            "custom_image_uri": None,  # ECR image built from ./Dockerfile; skips repackaging when set
             "training_job_name": "phi2-retrain-v5-20250831-010009",  # The completed job
             "model_artifacts": "s3://sagemaker-us-west-2-561947681110/phi2-retrain-v5-output/phi2-retrain-v5-20250831-010009/output/model.tar.gz"
         }
         
         logger.info(f"🔧 Initialized deployer for region {region}")
 
+    def instance_type(self):
+        """Instance type for the endpoint, smaller when weights are quantized"""
+        if self.config['quantization'] != 'none':
+            return self.config['quantized_instance']
+        return self.config['endpoint_instance']
+
+    def model_server_workers(self):
+        """Model server workers for the endpoint; two copies only on the fp16 A10G instance"""
+        if self.config['quantization'] != 'none':
+            return self.config['quantized_model_server_workers']
+        return self.config['model_server_workers']
+
+    def package_digest(self, source_etag):
+        """Hash the inference code and source artifact that make up a package"""
+        digest = hashlib.sha256(source_etag.encode())
+        for path in (INFERENCE_SCRIPT, os.path.join(CODE_DIR, 'requirements.txt')):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def extract_model_artifacts(self, bucket, key, source_etag):
+        """Extract the training artifacts once per S3 ETag and reuse them"""
+        cache_dir = os.path.join(MODEL_CACHE_DIR, source_etag)
+        if os.path.isdir(cache_dir):
+            logger.info(f"♻️ Reusing extracted model artifacts from {cache_dir}")
+            return cache_dir
+        
+        # Extract next to the cache entry and rename on success, so an
+        # interrupted run never leaves a half-populated directory behind
+        staging_dir = f"{cache_dir}.tmp"
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+        os.makedirs(staging_dir)
+        
+        # Stream the original artifacts straight into the extractor so the
+        # download and gunzip overlap instead of round-tripping via disk
+        logger.info("⬇️ Streaming and extracting original model artifacts...")
+        body = self.s3.get_object(Bucket=bucket, Key=key)['Body']
+        with tarfile.open(fileobj=body, mode='r|gz') as tar:
+            tar.extractall(staging_dir)
+        
+        os.rename(staging_dir, cache_dir)
+        return cache_dir
+
     def create_inference_package(self):
         """Create a tarball with model artifacts + custom inference script"""
         timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        temp_dir = f"/tmp/phi2_v5_model_{timestamp}"
         tarball_path = f"/tmp/phi2_v5_model_{timestamp}.tar.gz"
         
         logger.info("📦 Creating inference package with custom script...")
         
         try:
-            # Create temporary directory
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # Download original model artifacts
-            logger.info("⬇️ Downloading original model artifacts...")
-            original_model_path = f"{temp_dir}/original_model.tar.gz"
             bucket = self.config['bucket']
             key = self.config['model_artifacts'].replace(f"s3://{bucket}/", "")
             
-            self.s3.download_file(bucket, key, original_model_path)
-            
-            # Extract original model
-            logger.info("📂 Extracting model artifacts...")
-            with tarfile.open(original_model_path, 'r:gz') as tar:
-                tar.extractall(temp_dir)
+            # Packages are keyed by content, so an unchanged script + artifact
+            # pair is reused instead of being rebuilt and re-uploaded
+            source_etag = self.s3.head_object(Bucket=bucket, Key=key)['ETag'].strip('"')
+            upload_key = f"phi2-v5-inference-models/model-{self.package_digest(source_etag)[:16]}.tar.gz"
+            upload_s3_uri = f"s3://{bucket}/{upload_key}"
             
-            # Create code directory and add custom inference script
-            logger.info("📝 Adding custom inference script...")
-            import shutil
-            code_dir = f"{temp_dir}/code"
-            os.makedirs(code_dir, exist_ok=True)
+            try:
+                self.s3.head_object(Bucket=bucket, Key=upload_key)
+                logger.info(f"♻️ Inference package unchanged, reusing {upload_s3_uri}")
+                return upload_s3_uri
+            except ClientError as e:
+                # Only a missing package means rebuild; access or throttling
+                # errors must not be mistaken for it and trigger a re-upload
+                if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                    raise
             
-            shutil.copy('/Users/hema/Desktop/bedrock/inference_v5.py', f"{code_dir}/inference.py")
+            model_dir = self.extract_model_artifacts(bucket, key, source_etag)
             
-            # Create requirements.txt for inference dependencies
-            requirements_content = """torch>=1.9.0
-transformers>=4.21.0
-peft>=0.4.0
-accelerate>=0.20.0
-"""
-            with open(f"{code_dir}/requirements.txt", 'w') as f:
-                f.write(requirements_content)
-            
-            # Create new tarball with everything
+            # Create new tarball with the model artifacts and our code/ directory
             logger.info("🗜️ Creating new model package...")
             with tarfile.open(tarball_path, 'w:gz') as tar:
-                # Add all files from temp_dir, but skip the original tarball
-                for item in os.listdir(temp_dir):
-                    if item != 'original_model.tar.gz':
-                        item_path = os.path.join(temp_dir, item)
-                        tar.add(item_path, arcname=item)
+                for item in os.listdir(model_dir):
+                    if item != 'code':
+                        tar.add(os.path.join(model_dir, item), arcname=item)
+                
+                logger.info("📝 Adding custom inference script...")
+                tar.add(INFERENCE_SCRIPT, arcname='code/inference.py')
+                tar.add(os.path.join(CODE_DIR, 'requirements.txt'), arcname='code/requirements.txt')
             
             # Upload to S3
-            upload_key = f"phi2-v5-inference-models/model-{timestamp}.tar.gz"
-            upload_s3_uri = f"s3://{bucket}/{upload_key}"
-            
             logger.info(f"⬆️ Uploading to {upload_s3_uri}...")
-            self.s3.upload_file(tarball_path, bucket, upload_key)
+            self.s3.upload_file(tarball_path, bucket, upload_key, Config=TRANSFER_CONFIG)
             
             # Cleanup
-            shutil.rmtree(temp_dir)
             os.remove(tarball_path)
             
             logger.info("✅ Inference package created successfully")
@@ -102,8 +170,6 @@ accelerate>=0.20.0
         except Exception as e:
             logger.error(f"❌ Failed to create inference package: {e}")
             # Cleanup on error
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
             if os.path.exists(tarball_path):
                 os.remove(tarball_path)
             return None
@@ -119,15 +185,18 @@ accelerate>=0.20.0
             self.sagemaker.create_model(
                 ModelName=model_name,
                 PrimaryContainer={
-                    'Image': '763104351884.dkr.ecr.us-west-2.amazonaws.com/huggingface-pytorch-inference:2.1.0-transformers4.37.0-gpu-py310-cu118-ubuntu20.04',
+                    'Image': self.config['custom_image_uri'] or DLC_IMAGE,
                     'ModelDataUrl': model_data_url,
                     'Environment': {
                         'BASE_MODEL_ID': self.config['base_model'],
                         'HF_HOME': '/tmp/hf_home',
-                        'TRANSFORMERS_CACHE': '/tmp/transformers_cache',
                         'SAGEMAKER_PROGRAM': 'inference.py',  # Use our custom script
                         'SAGEMAKER_SUBMIT_DIRECTORY': '/opt/ml/code',
-                        'MMS_DEFAULT_RESPONSE_TIMEOUT': '900'  # 15 minutes timeout
+                        'MMS_DEFAULT_RESPONSE_TIMEOUT': '900',  # 15 minutes timeout
+                        'SAGEMAKER_MODEL_SERVER_WORKERS': str(self.model_server_workers()),
+                        'QUANTIZATION': self.config['quantization'],
+                        'CUDA_MEMORY_FRACTION': self.config['cuda_memory_fraction'],
+                        'PYTORCH_CUDA_ALLOC_CONF': 'expandable_segments:True,max_split_size_mb:512'
                     }
                 },
                 ExecutionRoleArn=self.config['role_arn']
@@ -154,8 +223,9 @@ accelerate>=0.20.0
                         'VariantName': 'primary',
                         'ModelName': model_name,
                         'InitialInstanceCount': 1,
-                        'InstanceType': self.config['endpoint_instance'],
-                        'InitialVariantWeight': 1.0
+                        'InstanceType': self.instance_type(),
+                        'InitialVariantWeight': 1.0,
+                        'ContainerStartupHealthCheckTimeoutInSeconds': self.config['startup_health_check_timeout']
                     }
                 ]
             )
@@ -174,18 +244,35 @@ accelerate>=0.20.0
         
         try:
             # Delete existing endpoints to free up quota
+            deleting = []
             for old_endpoint in ["phi2-v5-inference", "gold-phi2", "phi2-v5-geo-compliance"]:
                 try:
-                    self.sagemaker.describe_endpoint(EndpointName=old_endpoint)
-                    logger.info(f"🗑️ Deleting existing endpoint: {old_endpoint}")
-                    self.sagemaker.delete_endpoint(EndpointName=old_endpoint)
-                    time.sleep(10)  # Brief wait between deletions
-                except:
-                    pass  # Endpoint doesn't exist
+                    status = self.sagemaker.describe_endpoint(EndpointName=old_endpoint)['EndpointStatus']
+                    if status != 'Deleting':
+                        logger.info(f"🗑️ Deleting existing endpoint: {old_endpoint}")
+                        self.sagemaker.delete_endpoint(EndpointName=old_endpoint)
+                    # Only wait on deletions that are actually in progress
+                    deleting.append(old_endpoint)
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'ValidationException':
+                        raise
+                    message = e.response['Error']['Message']
+                    if 'Could not find' in message:
+                        continue  # Nothing to delete, the usual first deploy
+                    # Can't be deleted while it is Creating/Updating; leave it
+                    # and don't wait for it
+                    logger.warning(f"⚠️ Not deleting {old_endpoint}: {message}")
             
-            # Wait for all deletions to complete
-            logger.info("⏳ Waiting for endpoint deletions to complete...")
-            time.sleep(60)
+            # Wait for all deletions to complete; the waiter returns as soon as
+            # each endpoint is gone instead of sleeping a fixed minute
+            if deleting:
+                logger.info("⏳ Waiting for endpoint deletions to complete...")
+                waiter = self.sagemaker.get_waiter('endpoint_deleted')
+                for old_endpoint in deleting:
+                    waiter.wait(
+                        EndpointName=old_endpoint,
+                        WaiterConfig={'Delay': 15, 'MaxAttempts': 40}
+                    )
             
             self.sagemaker.create_endpoint(
                 EndpointName=endpoint_name,
@@ -202,12 +289,27 @@ accelerate>=0.20.0
         """Wait for endpoint to be InService"""
         logger.info(f"⏳ Waiting for endpoint {endpoint_name} to be ready...")
         
+        start_time = time.time()
+        prev_status = None
+        heartbeat_shown = False
+        
         while True:
             try:
                 response = self.sagemaker.describe_endpoint(EndpointName=endpoint_name)
                 status = response['EndpointStatus']
                 
-                logger.info(f"📊 Endpoint status: {status}")
+                # Log only status transitions; in between, rewrite a single
+                # heartbeat line on interactive terminals
+                if status != prev_status:
+                    if heartbeat_shown:
+                        sys.stdout.write("\n")
+                        heartbeat_shown = False
+                    logger.info(f"📊 Endpoint status: {status}")
+                    prev_status = status
+                elif sys.stdout.isatty():
+                    sys.stdout.write(f"\r⏳ [elapsed={time.time() - start_time:.0f}s] status={status}")
+                    sys.stdout.flush()
+                    heartbeat_shown = True
                 
                 if status == 'InService':
                     logger.info("✅ Endpoint is ready!")
@@ -224,11 +326,15 @@ accelerate>=0.20.0
 
     def deploy_full_pipeline(self):
         """Deploy complete pipeline with custom inference"""
-        logger.info("🚀 Starting Phi-2 v5 deployment with custom inference...")
-        logger.info("=" * 70)
+        logger.info("🚀 Starting Phi-2 v5 deployment with custom inference...\n%s", "=" * 70)
         
-        # Step 1: Create inference package
-        model_data_url = self.create_inference_package()
+        # Step 1: Create inference package; a custom image already carries the
+        # inference script, so the training artifacts are served as-is
+        if self.config['custom_image_uri']:
+            logger.info(f"🐳 Using custom image: {self.config['custom_image_uri']}")
+            model_data_url = self.config['model_artifacts']
+        else:
+            model_data_url = self.create_inference_package()
         if not model_data_url:
             return False
         
@@ -254,7 +360,7 @@ accelerate>=0.20.0
         logger.info("🎉 Deployment completed successfully!")
         logger.info(f"🔗 Endpoint name: {endpoint_name}")
         logger.info(f"📊 Model data: {model_data_url}")
-        logger.info(f"🔧 Instance type: {self.config['endpoint_instance']}")
+        logger.info(f"🔧 Instance type: {self.instance_type()}")
         logger.info("🧪 Ready for testing with custom inference logic!")
         
         return True
@@ -263,9 +369,7 @@ def main():
     """Main function"""
     deployer = Phi2V5InferenceDeployer()
     
-    logger.info("🎯 Phi-2 v5 Deployment with Custom Inference")
-    logger.info("Includes LoRA adapters + optimized inference script")
-    logger.info("=" * 70)
+    logger.info("🎯 Phi-2 v5 Deployment with Custom Inference\nIncludes LoRA adapters + optimized inference script\n%s", "=" * 70)
     
     success = deployer.deploy_full_pipeline()
     
@@ -1,5 +1,6 @@
 import json
 import boto3
+from botocore.config import Config
 import logging
 from typing import Dict, Any
 
@@ -7,8 +8,17 @@ from typing import Dict, Any
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize SageMaker client
-sagemaker_runtime = boto3.client('sagemaker-runtime', region_name='us-west-2')
+# Initialize SageMaker client once per container so warm invocations reuse
+# its connection pool; adaptive retries back off on endpoint throttling
+sagemaker_runtime = boto3.client(
+    'sagemaker-runtime',
+    region_name='us-west-2',
+    config=Config(
+        retries={'mode': 'adaptive', 'max_attempts': 3},
+        tcp_keepalive=True,
+        max_pool_connections=10
+    )
+)
 
 # Constants
 ENDPOINT_NAME = 'phi2-v5-inference'
@@ -75,7 +85,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         
         # Log the request (without sensitive data)
-        logger.info(f"Processing request - Instruction length: {len(instruction)}, Input length: {len(feature_input)}")
+        logger.info("Processing request - Instruction length: %d, Input length: %d", len(instruction), len(feature_input))
         
         # Prepare payload for SageMaker
         sagemaker_payload = {
@@ -84,7 +94,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
         
         # Invoke SageMaker endpoint
-        logger.info(f"Invoking SageMaker endpoint: {ENDPOINT_NAME}")
+        logger.info("Invoking SageMaker endpoint: %s", ENDPOINT_NAME)
         
         response = sagemaker_runtime.invoke_endpoint(
             EndpointName=ENDPOINT_NAME,
@@ -93,13 +103,13 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         )
         
         # Parse SageMaker response
-        result = json.loads(response['Body'].read().decode())
+        result = json.loads(response['Body'].read())  # json decodes UTF-8 bytes itself
         
         # Extract generated text
         generated_text = result.get('generated_text', '')
         
         # Log response info
-        logger.info(f"SageMaker response received - Generated text length: {len(generated_text)}")
+        logger.info("SageMaker response received - Generated text length: %d", len(generated_text))
         
         # Structure the response
         structured_response = {
@@ -130,7 +140,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
     except Exception as e:
         # Log the error
-        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        logger.error("Error processing request: %s", e, exc_info=True)
         
         # Return error response
         error_response = {
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Shared boto3 session and SageMaker runtime client for the endpoint test scripts
+"""
+
+import boto3
+from botocore.config import Config
+from functools import lru_cache
+
+PROFILE_NAME = 'bedrock-561'
+REGION = 'us-west-2'
+
+# Keep-alive pooled connections with adaptive retries for runtime calls; the
+# pool is wide enough for the scripts that invoke every case concurrently
+RUNTIME_CONFIG = Config(
+    tcp_keepalive=True,
+    connect_timeout=5,
+    retries={'max_attempts': 3, 'mode': 'adaptive'},
+    max_pool_connections=64
+)
+
+@lru_cache(maxsize=1)
+def get_session():
+    """Session built once, so the profile's credentials are resolved once per process"""
+    return boto3.Session(profile_name=PROFILE_NAME, region_name=REGION)
+
+@lru_cache(maxsize=1)
+def get_runtime_client():
+    """SageMaker runtime client shared by every invoke in the process"""
+    return get_session().client('sagemaker-runtime', config=RUNTIME_CONFIG)
@@ -4,139 +4,208 @@ Comprehensive test script for Phi-2 v5 jurisdiction awareness and law citation a
 Tests for jurisdiction mixups, prompt following, and compliance logic
 """
 
-import boto3
 import json
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import re
 
-class JurisdictionTester:
-    def __init__(self, endpoint_name='phi2-v5-inference'):
-        # Setup client
-        session = boto3.Session(profile_name='bedrock-561', region_name='us-west-2')
-        self.sagemaker_runtime = session.client('sagemaker-runtime')
-        self.endpoint_name = endpoint_name
-        
-        # Test cases designed to catch jurisdiction mixups
-        self.test_cases = [
-            {
-                "id": "EU_GDPR_PURE",
-                "name": "Pure EU GDPR Case",
-                "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
-                "input": """Feature Name: EU Cookie Consent Banner
+from aws_clients import get_runtime_client
+
+# Send every case in one list payload (inference_v5 batches it into a single
+# generate call); falls back to per-case requests if the endpoint can't
+BATCH_MODE = os.environ.get('BATCH_MODE', 'false').lower() == 'true'
+
+# Test cases designed to catch jurisdiction mixups, built once at import
+TEST_CASES = (
+    {
+        "id": "EU_GDPR_PURE",
+        "name": "Pure EU GDPR Case",
+        "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
+        "input": """Feature Name: EU Cookie Consent Banner
 Feature Description: Display cookie consent banner for EU users accessing the website, with options to accept or reject non-essential cookies.
 
 Law Context (structured JSON):
 [{"law": "GDPR Article 7", "jurisdiction": "EU", "requirement": "Valid consent for data processing"}]""",
-                "expected_jurisdiction": ["EU"],
-                "expected_laws": ["GDPR", "Article 7"],
-                "should_need_compliance": True
-            },
-            {
-                "id": "US_CCPA_PURE", 
-                "name": "Pure US CCPA Case",
-                "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
-                "input": """Feature Name: California Do Not Sell Button
+        "expected_jurisdiction": ["EU"],
+        "expected_laws": ["GDPR", "Article 7"],
+        "should_need_compliance": True
+    },
+    {
+        "id": "US_CCPA_PURE", 
+        "name": "Pure US CCPA Case",
+        "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
+        "input": """Feature Name: California Do Not Sell Button
 Feature Description: Provides California residents with a button to opt-out of personal information sales as required by state law.
 
 Law Context (structured JSON):
 [{"law": "CCPA Section 1798.135", "jurisdiction": "US-CA", "requirement": "Right to opt-out of sale of personal information"}]""",
-                "expected_jurisdiction": ["US", "CA", "California"],
-                "expected_laws": ["CCPA", "1798.135"],
-                "should_need_compliance": True
-            },
-            {
-                "id": "MIXED_JURISDICTION_TRAP",
-                "name": "Mixed Jurisdiction Trap Test",
-                "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
-                "input": """Feature Name: Global User Registration
+        "expected_jurisdiction": ["US", "CA", "California"],
+        "expected_laws": ["CCPA", "1798.135"],
+        "should_need_compliance": True
+    },
+    {
+        "id": "MIXED_JURISDICTION_TRAP",
+        "name": "Mixed Jurisdiction Trap Test",
+        "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
+        "input": """Feature Name: Global User Registration
 Feature Description: Standard user registration form collecting name, email, and basic preferences for global users.
 
 Law Context (structured JSON):
 [{"law": "GDPR Article 6", "jurisdiction": "EU", "requirement": "Lawful basis for processing"}, {"law": "CCPA Section 1798.100", "jurisdiction": "US-CA", "requirement": "Right to know about personal information"}]""",
-                "expected_jurisdiction": ["EU", "US", "CA"],
-                "expected_laws": ["GDPR", "CCPA", "Article 6", "1798.100"],
-                "should_need_compliance": True
-            },
-            {
-                "id": "NO_LAW_CONTEXT_TRAP",
-                "name": "No Law Context - Should Say No Compliance",
-                "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
-                "input": """Feature Name: Dark Mode Toggle
+        "expected_jurisdiction": ["EU", "US", "CA"],
+        "expected_laws": ["GDPR", "CCPA", "Article 6", "1798.100"],
+        "should_need_compliance": True
+    },
+    {
+        "id": "NO_LAW_CONTEXT_TRAP",
+        "name": "No Law Context - Should Say No Compliance",
+        "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
+        "input": """Feature Name: Dark Mode Toggle
 Feature Description: Simple UI toggle allowing users to switch between light and dark themes for better user experience.
 
 Law Context (structured JSON):
 []""",
-                "expected_jurisdiction": [],
-                "expected_laws": [],
-                "should_need_compliance": False
-            },
-            {
-                "id": "WRONG_JURISDICTION_TRAP",
-                "name": "Wrong Jurisdiction Trap - Should Only Reference Provided Laws",
-                "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
-                "input": """Feature Name: Employee Payroll System
+        "expected_jurisdiction": [],
+        "expected_laws": [],
+        "should_need_compliance": False
+    },
+    {
+        "id": "WRONG_JURISDICTION_TRAP",
+        "name": "Wrong Jurisdiction Trap - Should Only Reference Provided Laws",
+        "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
+        "input": """Feature Name: Employee Payroll System
 Feature Description: Internal system for processing employee salaries and tax withholdings for Canadian employees.
 
 Law Context (structured JSON):
 [{"law": "Privacy Act Section 8", "jurisdiction": "CA", "requirement": "Protection of personal information"}]""",
-                "expected_jurisdiction": ["CA", "Canada"],
-                "expected_laws": ["Privacy Act", "Section 8"],
-                "should_need_compliance": True,
-                "forbidden_laws": ["GDPR", "CCPA", "SOX"]  # Should not cite these
-            },
-            {
-                "id": "FINANCIAL_SOX_TEST",
-                "name": "US Financial SOX Compliance",
-                "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
-                "input": """Feature Name: Financial Audit Trail Logger
+        "expected_jurisdiction": ["CA", "Canada"],
+        "expected_laws": ["Privacy Act", "Section 8"],
+        "should_need_compliance": True,
+        "forbidden_laws": ["GDPR", "CCPA", "SOX"]  # Should not cite these
+    },
+    {
+        "id": "FINANCIAL_SOX_TEST",
+        "name": "US Financial SOX Compliance",
+        "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
+        "input": """Feature Name: Financial Audit Trail Logger
 Feature Description: Logs all financial transactions and database changes for compliance auditing in US public companies.
 
 Law Context (structured JSON):
 [{"law": "SOX Section 404", "jurisdiction": "US", "requirement": "Internal controls over financial reporting"}]""",
-                "expected_jurisdiction": ["US"],
-                "expected_laws": ["SOX", "Section 404", "Sarbanes-Oxley"],
-                "should_need_compliance": True
-            },
-            {
-                "id": "HALLUCINATION_TRAP",
-                "name": "Hallucination Test - Empty Context Should Not Invent Laws",
-                "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
-                "input": """Feature Name: Weather Widget
+        "expected_jurisdiction": ["US"],
+        "expected_laws": ["SOX", "Section 404", "Sarbanes-Oxley"],
+        "should_need_compliance": True
+    },
+    {
+        "id": "HALLUCINATION_TRAP",
+        "name": "Hallucination Test - Empty Context Should Not Invent Laws",
+        "instruction": "Analyse the feature artifact and decide if geo-specific compliance logic is needed. Explain why and cite the relevant regulation if any.",
+        "input": """Feature Name: Weather Widget
 Feature Description: Displays current weather information based on user's location for better user experience.
 
 Law Context (structured JSON):
 []""",
-                "expected_jurisdiction": [],
-                "expected_laws": [],
-                "should_need_compliance": False,
-                "forbidden_laws": ["GDPR", "CCPA", "SOX", "HIPAA", "PCI-DSS"]  # Should not hallucinate these
-            }
-        ]
+        "expected_jurisdiction": [],
+        "expected_laws": [],
+        "should_need_compliance": False,
+        "forbidden_laws": ["GDPR", "CCPA", "SOX", "HIPAA", "PCI-DSS"]  # Should not hallucinate these
+    }
+)
+
+# Request bodies never change between runs, so serialize them once
+REQUEST_BODIES = {
+    test_case["id"]: json.dumps({
+        "instruction": test_case["instruction"],
+        "input": test_case["input"]
+    }).encode()
+    for test_case in TEST_CASES
+}
+
+# Expected and forbidden terms are lowered once here, not per analysis
+LOWERED_TERMS = {
+    test_case["id"]: {
+        field: [(term, term.lower()) for term in test_case.get(field, [])]
+        for field in ("expected_jurisdiction", "expected_laws", "forbidden_laws")
+    }
+    for test_case in TEST_CASES
+}
 
-    def invoke_model(self, instruction, input_text):
-        """Invoke the model with given instruction and input"""
+class JurisdictionTester:
+    def __init__(self, endpoint_name='phi2-v5-inference'):
+        # Kept-alive pooled client shared with the other endpoint test scripts
+        self.sagemaker_runtime = get_runtime_client()
+        self.endpoint_name = endpoint_name
+        
+        self.test_cases = TEST_CASES
+        self.request_bodies = REQUEST_BODIES
+        self.lowered_terms = LOWERED_TERMS
+
+    def invoke_model(self, instruction, input_text, body=None):
+        """Invoke the model with given instruction and input, or a pre-encoded body"""
         try:
-            payload = {
-                "instruction": instruction,
-                "input": input_text
-            }
+            if body is None:
+                payload = {
+                    "instruction": instruction,
+                    "input": input_text
+                }
+                body = json.dumps(payload).encode()
             
             response = self.sagemaker_runtime.invoke_endpoint(
                 EndpointName=self.endpoint_name,
                 ContentType='application/json',
-                Body=json.dumps(payload)
+                Body=body
             )
             
-            result = json.loads(response['Body'].read().decode())
+            result = json.loads(response['Body'].read())
             return result.get('generated_text', ''), True
             
         except Exception as e:
             return f"ERROR: {str(e)}", False
 
+    def run_case(self, test_case):
+        """Invoke the model for one test case and time the round-trip"""
+        start_time = time.time()
+        response_text, success = self.invoke_model(
+            test_case["instruction"], test_case["input"], body=self.request_bodies[test_case["id"]]
+        )
+        return response_text, success, time.time() - start_time
+
+    def run_batch(self):
+        """Invoke all cases in one request; None if the endpoint doesn't answer with a list"""
+        # Join the pre-encoded case bodies into one JSON list payload
+        body = b"[" + b",".join(self.request_bodies[tc["id"]] for tc in self.test_cases) + b"]"
+        
+        start_time = time.time()
+        try:
+            response = self.sagemaker_runtime.invoke_endpoint(
+                EndpointName=self.endpoint_name,
+                ContentType='application/json',
+                Body=body
+            )
+            result = json.loads(response['Body'].read())
+        except Exception as e:
+            print(f"⚠️ Batched invoke failed, falling back to per-case requests: {e}")
+            return None
+        response_time = time.time() - start_time
+        
+        if not isinstance(result, list) or len(result) != len(self.test_cases):
+            print("⚠️ Endpoint did not return a list, falling back to per-case requests")
+            return None
+        
+        # Every case shares the latency of the single batched request; an
+        # element predict_fn rejected carries an error instead of text
+        return [
+            (f"ERROR: {r['error']}", False, response_time) if 'error' in r
+            else (r.get('generated_text', ''), True, response_time)
+            for r in result
+        ]
+
     def analyze_response(self, response_text, test_case):
         """Analyze response for jurisdiction awareness, law citation accuracy, and compliance logic"""
         response_lower = response_text.lower()
+        terms = self.lowered_terms[test_case["id"]]
         
         analysis = {
             "prompt_following": False,
@@ -158,9 +227,9 @@ Law Context (structured JSON):
             analysis["reasoning"].append("❌ Does not follow prompt structure")
         
         # Check jurisdiction accuracy
-        expected_jurisdictions = test_case.get("expected_jurisdiction", [])
-        for jurisdiction in expected_jurisdictions:
-            if jurisdiction.lower() in response_lower:
+        expected_jurisdictions = terms["expected_jurisdiction"]
+        for jurisdiction, jurisdiction_lower in expected_jurisdictions:
+            if jurisdiction_lower in response_lower:
                 analysis["mentioned_jurisdictions"].append(jurisdiction)
         
         if expected_jurisdictions:
@@ -170,9 +239,9 @@ Law Context (structured JSON):
             analysis["jurisdiction_accuracy"] = 1.0 if not analysis["mentioned_jurisdictions"] else 0.0
             
         # Check law citation accuracy
-        expected_laws = test_case.get("expected_laws", [])
-        for law in expected_laws:
-            if law.lower() in response_lower:
+        expected_laws = terms["expected_laws"]
+        for law, law_lower in expected_laws:
+            if law_lower in response_lower:
                 analysis["mentioned_laws"].append(law)
         
         if expected_laws:
@@ -182,9 +251,8 @@ Law Context (structured JSON):
             analysis["law_citation_accuracy"] = 1.0 if not analysis["mentioned_laws"] else 0.0
         
         # Check for forbidden law hallucinations
-        forbidden_laws = test_case.get("forbidden_laws", [])
-        for forbidden_law in forbidden_laws:
-            if forbidden_law.lower() in response_lower:
+        for forbidden_law, forbidden_law_lower in terms["forbidden_laws"]:
+            if forbidden_law_lower in response_lower:
                 analysis["forbidden_law_violations"].append(forbidden_law)
                 analysis["hallucination_detected"] = True
         
@@ -218,7 +286,15 @@ Law Context (structured JSON):
         
         results = []
         
-        for i, test_case in enumerate(self.test_cases, 1):
+        case_results = self.run_batch() if BATCH_MODE else None
+        if case_results is None:
+            # Cases are independent, so their endpoint round-trips overlap; the
+            # report below still walks them in order
+            with ThreadPoolExecutor(max_workers=len(self.test_cases)) as executor:
+                futures = [executor.submit(self.run_case, test_case) for test_case in self.test_cases]
+            case_results = [future.result() for future in futures]
+        
+        for i, (test_case, case_result) in enumerate(zip(self.test_cases, case_results), 1):
             print(f"\n🧪 Test {i}/{len(self.test_cases)}: {test_case['name']}")
             print("-" * 60)
             print(f"📝 ID: {test_case['id']}")
@@ -226,10 +302,7 @@ Law Context (structured JSON):
             print(f"⚖️ Expected Laws: {test_case.get('expected_laws', [])}")
             print(f"🚨 Forbidden Laws: {test_case.get('forbidden_laws', [])}")
             
-            # Invoke model
-            start_time = time.time()
-            response_text, success = self.invoke_model(test_case["instruction"], test_case["input"])
-            response_time = time.time() - start_time
+            response_text, success, response_time = case_result
             
             if success:
                 print(f"⏱️ Response Time: {response_time:.2f}s")
@@ -306,11 +379,38 @@ Law Context (structured JSON):
         print("\n📋 COMPREHENSIVE ANALYSIS REPORT")
         print("=" * 80)
         
+        # Accumulate every metric and critical issue in one pass over the results
+        total_response_time = total_overall_score = 0
+        prompt_following_count = compliance_logic_count = hallucination_count = 0
+        total_jurisdiction_accuracy = total_law_citation_accuracy = 0
+        critical_issues = []
+        
+        for result in successful_results:
+            analysis = result['analysis']
+            name = result['test_case']['name']
+            
+            total_response_time += result['response_time']
+            total_overall_score += result['overall_score']
+            prompt_following_count += analysis['prompt_following']
+            total_jurisdiction_accuracy += analysis['jurisdiction_accuracy']
+            total_law_citation_accuracy += analysis['law_citation_accuracy']
+            compliance_logic_count += analysis['compliance_logic_correct']
+            hallucination_count += analysis['hallucination_detected']
+            
+            if analysis['hallucination_detected']:
+                critical_issues.append(f"  ❌ {name}: Law hallucination - {analysis['forbidden_law_violations']}")
+            
+            if not analysis['compliance_logic_correct']:
+                critical_issues.append(f"  ❌ {name}: Incorrect compliance logic")
+            
+            if analysis['jurisdiction_accuracy'] < 0.5:
+                critical_issues.append(f"  ❌ {name}: Poor jurisdiction awareness")
+        
         # Overall statistics
         total_tests = len(results)
         successful_tests = len(successful_results)
-        avg_response_time = sum(r['response_time'] for r in successful_results) / len(successful_results)
-        avg_overall_score = sum(r['overall_score'] for r in successful_results) / len(successful_results)
+        avg_response_time = total_response_time / successful_tests
+        avg_overall_score = total_overall_score / successful_tests
         
         print(f"📊 Test Summary:")
         print(f"  Total Tests: {total_tests}")
@@ -320,11 +420,11 @@ Law Context (structured JSON):
         print(f"  Average Overall Score: {avg_overall_score:.0f}%")
         
         # Detailed analysis
-        prompt_following_rate = sum(1 for r in successful_results if r['analysis']['prompt_following']) / len(successful_results)
-        avg_jurisdiction_accuracy = sum(r['analysis']['jurisdiction_accuracy'] for r in successful_results) / len(successful_results)
-        avg_law_citation_accuracy = sum(r['analysis']['law_citation_accuracy'] for r in successful_results) / len(successful_results)
-        compliance_logic_rate = sum(1 for r in successful_results if r['analysis']['compliance_logic_correct']) / len(successful_results)
-        hallucination_rate = sum(1 for r in successful_results if r['analysis']['hallucination_detected']) / len(successful_results)
+        prompt_following_rate = prompt_following_count / successful_tests
+        avg_jurisdiction_accuracy = total_jurisdiction_accuracy / successful_tests
+        avg_law_citation_accuracy = total_law_citation_accuracy / successful_tests
+        compliance_logic_rate = compliance_logic_count / successful_tests
+        hallucination_rate = hallucination_count / successful_tests
         
         print(f"\n🎯 Performance Metrics:")
         print(f"  📋 Prompt Following Rate: {prompt_following_rate:.0%}")
@@ -335,18 +435,6 @@ Law Context (structured JSON):
         
         # Critical issues
         print(f"\n🚨 Critical Issues Detected:")
-        critical_issues = []
-        
-        for result in successful_results:
-            if result['analysis']['hallucination_detected']:
-                critical_issues.append(f"  ❌ {result['test_case']['name']}: Law hallucination - {result['analysis']['forbidden_law_violations']}")
-            
-            if not result['analysis']['compliance_logic_correct']:
-                critical_issues.append(f"  ❌ {result['test_case']['name']}: Incorrect compliance logic")
-            
-            if result['analysis']['jurisdiction_accuracy'] < 0.5:
-                critical_issues.append(f"  ❌ {result['test_case']['name']}: Poor jurisdiction awareness")
-        
         if critical_issues:
             for issue in critical_issues:
                 print(issue)
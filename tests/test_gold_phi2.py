@@ -3,16 +3,16 @@
 Test script for the gold-phi2 endpoint (Phi-2 v5 model with correct env vars)
 """
 
-import boto3
 import json
 import time
 
+from aws_clients import get_runtime_client, get_session
+
 def test_gold_phi2():
     """Test the gold-phi2 endpoint"""
     
     # Setup client
-    session = boto3.Session(profile_name='bedrock-561', region_name='us-west-2')
-    sagemaker_runtime = session.client('sagemaker-runtime')
+    sagemaker_runtime = get_runtime_client()
     
     endpoint_name = 'gold-phi2'
     
@@ -41,7 +41,7 @@ Law Context (structured JSON):
         )
         
         # Parse response
-        result = json.loads(response['Body'].read().decode())
+        result = json.loads(response['Body'].read())
         
         print("✅ SUCCESS: Model responded!")
         print("\n📊 Test Input:")
@@ -56,14 +56,15 @@ Law Context (structured JSON):
             print(f"\n📏 Response length: {len(output_text)} characters")
             
             # Basic quality checks
+            output_lower = output_text.lower()
             quality_indicators = []
-            if 'compliance' in output_text.lower():
+            if 'compliance' in output_lower:
                 quality_indicators.append("✅ Mentions compliance")
-            if 'gdpr' in output_text.lower():
+            if 'gdpr' in output_lower:
                 quality_indicators.append("✅ Cites GDPR")
-            if 'article 6' in output_text.lower():
+            if 'article 6' in output_lower:
                 quality_indicators.append("✅ References Article 6")
-            if any(word in output_text.lower() for word in ['required', 'needed', 'necessary']):
+            if any(word in output_lower for word in ['required', 'needed', 'necessary']):
                 quality_indicators.append("✅ Makes recommendation")
             
             print(f"\n🔍 Quality Analysis:")
@@ -86,7 +87,7 @@ Law Context (structured JSON):
 
 def check_endpoint_status():
     """Check if endpoint is ready"""
-    session = boto3.Session(profile_name='bedrock-561', region_name='us-west-2')
+    session = get_session()
     sagemaker = session.client('sagemaker')
     
     try:
@@ -3,34 +3,39 @@
 Test the actual phi-2 endpoint to understand its format
 """
 
-import boto3
 import json
 import logging
 
+from aws_clients import get_runtime_client
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 
 ENDPOINT_NAME = "phi-2"
-REGION = "us-west-2"
+
+# Both probe payloads are fixed, so they are encoded once at import
+HF_FORMAT_BODY = json.dumps({
+    "inputs": "Analyze this feature: User authentication system",
+    "parameters": {"max_new_tokens": 100, "temperature": 0.7, "do_sample": True}
+}).encode()
+
+INSTRUCTION_FORMAT_BODY = json.dumps({
+    "instruction": "Analyze the following software feature to determine its geo-compliance requirements.",
+    "input": "Feature Name: User Authentication\nFeature Description: System that collects user location data."
+}).encode()
 
 def test_format_1():
     """Test with Hugging Face format"""
     logger.info("🧪 Testing Hugging Face format...")
-    session = boto3.Session(profile_name='bedrock-561', region_name=REGION)
-    rt = session.client('sagemaker-runtime')
-
-    payload = {
-        "inputs": "Analyze this feature: User authentication system",
-        "parameters": {"max_new_tokens": 100, "temperature": 0.7, "do_sample": True}
-    }
+    rt = get_runtime_client()
 
     try:
         resp = rt.invoke_endpoint(
             EndpointName=ENDPOINT_NAME,
             ContentType='application/json',
-            Body=json.dumps(payload)
+            Body=HF_FORMAT_BODY
         )
-        result = json.loads(resp['Body'].read().decode())
+        result = json.loads(resp['Body'].read())
         logger.info("✅ Hugging Face format works!")
         logger.info(json.dumps(result, indent=2))
         return True
@@ -41,21 +46,15 @@ def test_format_1():
 def test_format_2():
     """Test with instruction/input format"""
     logger.info("🧪 Testing instruction/input format...")
-    session = boto3.Session(profile_name='bedrock-561', region_name=REGION)
-    rt = session.client('sagemaker-runtime')
-
-    payload = {
-        "instruction": "Analyze the following software feature to determine its geo-compliance requirements.",
-        "input": "Feature Name: User Authentication\nFeature Description: System that collects user location data."
-    }
+    rt = get_runtime_client()
 
     try:
         resp = rt.invoke_endpoint(
             EndpointName=ENDPOINT_NAME,
             ContentType='application/json',
-            Body=json.dumps(payload)
+            Body=INSTRUCTION_FORMAT_BODY
         )
-        result = json.loads(resp['Body'].read().decode())
+        result = json.loads(resp['Body'].read())
         logger.info("✅ Instruction/input format works!")
         logger.info(json.dumps(result, indent=2))
         return True
@@ -5,13 +5,31 @@ Test script for Phi-2 v5 Lambda function with various compliance scenarios
 
 import requests
 import json
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+def phrase_matcher(phrases):
+    """Compile phrases into one alternation so a response is scanned once per check"""
+    return re.compile('|'.join(re.escape(phrase) for phrase in phrases))
+
+# Quality-check phrase sets, compiled once for every analyzed response
+COMPLIANCE_MATCHER = phrase_matcher(['compliance', 'required', 'needed', 'necessary'])
+NO_COMPLIANCE_MATCHER = phrase_matcher(['no compliance', 'not required', 'not needed'])
+HALLUCINATED_LAW_MATCHER = phrase_matcher(['gdpr', 'ccpa', 'sox', 'hipaa'])
+REASONING_MATCHER = phrase_matcher(['because', 'since', 'due to', 'therefore'])
+
 class Phi2LambdaTester:
     def __init__(self, function_url=None, function_name=None):
         self.function_url = function_url
         self.function_name = function_name
+        self.lambda_client = None
+        
+        if function_name:
+            from aws_clients import get_session
+            # One client shared by the concurrent invokes; boto3 clients are thread-safe
+            self.lambda_client = get_session().client('lambda')
         
         # Test cases for Lambda testing
         self.test_cases = [
@@ -95,10 +113,6 @@ Law Context (structured JSON):
             return None, "No function name provided"
         
         try:
-            import boto3
-            session = boto3.Session(profile_name='bedrock-561', region_name='us-west-2')
-            lambda_client = session.client('lambda')
-            
             payload = {
                 'httpMethod': 'POST',
                 'body': json.dumps({
@@ -108,14 +122,14 @@ Law Context (structured JSON):
             }
             
             start_time = time.time()
-            response = lambda_client.invoke(
+            response = self.lambda_client.invoke(
                 FunctionName=self.function_name,
                 InvocationType='RequestResponse',
                 Payload=json.dumps(payload)
             )
             response_time = time.time() - start_time
             
-            result = json.loads(response['Payload'].read().decode())
+            result = json.loads(response['Payload'].read())
             
             if result.get('statusCode') == 200:
                 body = json.loads(result.get('body', '{}'))
@@ -144,13 +158,13 @@ Law Context (structured JSON):
         
         # Check for compliance awareness
         if test_case.get('expected_compliance'):
-            if any(word in generated_text for word in ['compliance', 'required', 'needed', 'necessary']):
+            if COMPLIANCE_MATCHER.search(generated_text):
                 strengths.append("✅ Correctly identifies compliance need")
                 score += 25
             else:
                 issues.append("❌ Misses compliance requirement")
         else:
-            if any(word in generated_text for word in ['no compliance', 'not required', 'not needed']):
+            if NO_COMPLIANCE_MATCHER.search(generated_text):
                 strengths.append("✅ Correctly identifies no compliance need")
                 score += 25
             else:
@@ -169,7 +183,7 @@ Law Context (structured JSON):
             score += 25
         elif '[]' in law_context:
             # No laws provided - should not cite any
-            if not any(law in generated_text for law in ['gdpr', 'ccpa', 'sox', 'hipaa']):
+            if not HALLUCINATED_LAW_MATCHER.search(generated_text):
                 strengths.append("✅ No law hallucination")
                 score += 25
             else:
@@ -183,7 +197,7 @@ Law Context (structured JSON):
             issues.append("❌ Response too short")
         
         # Check for reasoning
-        if any(word in generated_text for word in ['because', 'since', 'due to', 'therefore']):
+        if REASONING_MATCHER.search(generated_text):
             strengths.append("✅ Provides reasoning")
             score += 25
         else:
@@ -204,6 +218,12 @@ Law Context (structured JSON):
         
         results = []
         
+        # The cases are independent, so send them all at once and report in
+        # order; wall time is the slowest call rather than the sum
+        invoke = self.test_via_function_url if self.function_url else self.test_via_lambda_invoke
+        with ThreadPoolExecutor(max_workers=len(self.test_cases)) as executor:
+            responses = list(executor.map(invoke, self.test_cases))
+        
         for i, test_case in enumerate(self.test_cases, 1):
             print(f"\n🧪 Test {i}/{len(self.test_cases)}: {test_case['name']}")
             print("-" * 50)
@@ -211,7 +231,7 @@ Law Context (structured JSON):
             # Test via Function URL if available
             if self.function_url:
                 print("🌐 Testing via Function URL...")
-                response, response_time = self.test_via_function_url(test_case)
+                response, response_time = responses[i - 1]
                 
                 if response:
                     print(f"✅ Function URL test successful ({response_time:.2f}s)")
@@ -256,7 +276,7 @@ Law Context (structured JSON):
             # Test via Lambda invoke if available
             elif self.function_name:
                 print("📡 Testing via Lambda invoke...")
-                response, response_time = self.test_via_lambda_invoke(test_case)
+                response, response_time = responses[i - 1]
                 
                 if response:
                     print(f"✅ Lambda invoke test successful ({response_time:.2f}s)")
@@ -316,8 +336,8 @@ Law Context (structured JSON):
         # Overall statistics
         total_tests = len(results)
         successful_tests = len(successful_results)
-        avg_response_time = sum(r.get('response_time', 0) for r in successful_results) / len(successful_results)
-        avg_quality_score = sum(r.get('quality_score', 0) for r in successful_results) / len(successful_results)
+        avg_response_time = sum(r.get('response_time', 0) for r in successful_results) / successful_tests
+        avg_quality_score = sum(r.get('quality_score', 0) for r in successful_results) / successful_tests
         
         print(f"📊 Test Summary:")
         print(f"  Total Tests: {total_tests}")
@@ -3,16 +3,15 @@
 Test script for the new Phi-2 v5 model endpoint
 """
 
-import boto3
 import json
 import time
 
+from aws_clients import get_runtime_client
+
 def test_phi2_v5():
     """Test the new Phi-2 v5 endpoint"""
     
-    # Setup client
-    session = boto3.Session(profile_name='bedrock-561', region_name='us-west-2')
-    sagemaker_runtime = session.client('sagemaker-runtime')
+    sagemaker_runtime = get_runtime_client()
     
     endpoint_name = 'phi2-v5-geo-compliance'
     
@@ -39,7 +38,7 @@ Law Context (structured JSON):
         )
         
         # Parse response
-        result = json.loads(response['Body'].read().decode())
+        result = json.loads(response['Body'].read())
         
         print("✅ SUCCESS: Model responded")
         print("\n📊 Test Input:")